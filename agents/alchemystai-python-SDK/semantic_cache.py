@@ -0,0 +1,187 @@
+# Vendored copy: agents are self-contained, so this module also lives in
+# agents/company_research/semantic_cache.py. Keep both copies in sync.
+
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+
+import numpy as np
+
+# Small local model so cache lookups don't need a network round-trip
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+@lru_cache(maxsize=1)
+def get_embedding_model():
+    """Import and load the embedding model on first use"""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+
+@lru_cache(maxsize=4096)
+def embed_query(query: str):
+    """Embed a query with the local model, memoized per query string"""
+    vector = get_embedding_model().encode(query, normalize_embeddings=True).astype(np.float32)
+    vector.setflags(write=False)
+    return vector
+
+
+class SemanticCache:
+    """In-process LRU + TTL cache keyed by query embeddings.
+
+    A lookup hits when a cached query embedding has cosine similarity of at
+    least ``threshold`` with the probe, so rephrased questions reuse earlier
+    search results instead of going back to Alchemyst.
+
+    Candidates are found with random-hyperplane LSH: each embedding gets a
+    ``num_tables * bits_per_table`` bit signature, and every table buckets
+    entries on its own slice of those bits. Only entries sharing at least one
+    bucket with the probe are compared with exact cosine similarity.
+
+    Once ``pca_fit_size`` queries have been cached, a PCA projection down to
+    ``pca_components`` dimensions is fitted on them, the index is rebuilt with
+    projected vectors and only projected vectors are stored from then on.
+    """
+
+    def __init__(self, threshold: float = 0.85, ttl: float = 300, max_size: int = 512,
+                 num_tables: int = 16, bits_per_table: int = 6, seed: int = 0,
+                 pca_components: int = 64, pca_fit_size: int = 2048):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self.num_tables = num_tables
+        self.bits_per_table = bits_per_table
+        self.seed = seed
+        self.pca_components = pca_components
+        self.pca_fit_size = pca_fit_size
+        self._pca_mean = None
+        self._pca_basis = None
+        self._pca_samples = []
+        self._planes = None
+        self._tables = [defaultdict(set) for _ in range(num_tables)]
+        self._entries = OrderedDict()  # id -> (vector, value, inserted_at, keys)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def get(self, embedding):
+        """Return the cached value for the nearest query, or None on a miss"""
+        with self._lock:
+            if self._planes is None or not self._entries:
+                return None
+
+            query = self._reduce(self._normalize(embedding))
+
+            candidates = set()
+            for table, key in zip(self._tables, self._signature(query)):
+                candidates.update(table.get(key, ()))
+            if not candidates:
+                return None
+
+            now = time.time()
+            live = []
+            for entry_id in candidates:
+                if now - self._entries[entry_id][2] > self.ttl:
+                    self._remove(entry_id)
+                else:
+                    live.append(entry_id)
+            if not live:
+                return None
+
+            scores = np.stack([self._entries[i][0] for i in live]) @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+
+            entry_id = live[best]
+            self._entries.move_to_end(entry_id)
+            return self._entries[entry_id][1]
+
+    def put(self, embedding, value):
+        """Cache a value under the given query embedding"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._pca_basis is None and self.pca_components:
+                self._pca_samples.append(vector)
+                if len(self._pca_samples) >= self.pca_fit_size:
+                    self._fit_pca()
+            vector = self._reduce(vector)
+
+            if self._planes is None:
+                self._planes = self._make_planes(vector.shape[0])
+
+            while len(self._entries) >= self.max_size:
+                self._remove(next(iter(self._entries)))
+
+            entry_id = self._next_id
+            self._next_id += 1
+            keys = self._signature(vector)
+            for table, key in zip(self._tables, keys):
+                table[key].add(entry_id)
+            self._entries[entry_id] = (vector, value, time.time(), keys)
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+            for table in self._tables:
+                table.clear()
+
+    def _make_planes(self, dim):
+        rng = np.random.default_rng(self.seed)
+        return rng.standard_normal(
+            (dim, self.num_tables * self.bits_per_table)
+        ).astype(np.float32)
+
+    def _fit_pca(self):
+        samples = np.stack(self._pca_samples)
+        self._pca_samples = []
+        if samples.shape[1] <= self.pca_components:
+            self.pca_components = 0
+            return
+
+        self._pca_mean = samples.mean(axis=0)
+        _, _, vt = np.linalg.svd(samples - self._pca_mean, full_matrices=False)
+        self._pca_basis = vt[:self.pca_components].T.astype(np.float32)
+
+        # Rebuild the index in the projected space
+        self._planes = self._make_planes(self.pca_components)
+        for table in self._tables:
+            table.clear()
+        for entry_id, (vector, value, inserted_at, _) in self._entries.items():
+            vector = self._reduce(vector)
+            keys = self._signature(vector)
+            for table, key in zip(self._tables, keys):
+                table[key].add(entry_id)
+            self._entries[entry_id] = (vector, value, inserted_at, keys)
+
+    def _reduce(self, vector):
+        if self._pca_basis is None:
+            return vector
+        return self._normalize((vector - self._pca_mean) @ self._pca_basis)
+
+    def _signature(self, vector):
+        bits = (vector @ self._planes) > 0
+        return [
+            np.packbits(band).tobytes()
+            for band in bits.reshape(self.num_tables, self.bits_per_table)
+        ]
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for table, key in zip(self._tables, entry[3]):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del table[key]
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        return vector
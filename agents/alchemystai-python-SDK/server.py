@@ -1,13 +1,20 @@
 import datetime
+import hashlib
+import json
 import os
 import shutil
 import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 
 from alchemyst_ai import AlchemystAI
 from dotenv import load_dotenv
 from google.generativeai import GenerativeModel, configure
 
+from semantic_cache import SemanticCache, embed_query
+
 # Load env vars
 load_dotenv()
 ALCHEMYST_KEY = os.getenv("ALCHEMYST_AI_API_KEY")
@@ -23,6 +30,42 @@ model = GenerativeModel("gemini-2.0-flash")
 
 context_id = f"project_navigator_{int(time.time())}"
 
+# Maximum number of documents sent in a single context.add call. Documents are
+# embedded server-side, so each shard is embedded as one batch by Alchemyst.
+INGEST_BATCH_SIZE = 32
+# Number of batches uploaded concurrently
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "8"))
+# Maximum number of context.add requests in flight at once
+INGEST_PARALLEL = int(os.getenv("INGEST_PARALLEL", "4"))
+_ingest_slots = threading.Semaphore(INGEST_PARALLEL)
+# Number of files read from disk concurrently
+READ_WORKERS = 16
+
+# Source name the codebase documents are ingested under
+INGEST_SOURCE = "project-codebase"
+
+# Sidecar file recording the content hash of each ingested file path, grouped
+# by API key and source so switching accounts doesn't skip files
+INGEST_CACHE_PATH = os.getenv(
+    "INGEST_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "alchemyst", "ingested.json")
+)
+# Set INGEST_FORCE=1 to upload every file again, e.g. after the server dropped them
+INGEST_FORCE = os.getenv("INGEST_FORCE", "").lower() in ("1", "true", "yes")
+
+# Translation table deleting control characters other than tab and newline
+_CONTROL_CHARS = dict.fromkeys(i for i in range(32) if i not in (9, 10))
+
+search_cache = SemanticCache(threshold=0.85, ttl=300, max_size=512)
+
+ANSWER_PROMPT_TEMPLATE = """Based on the following context, please answer the question.
+If the context is insufficient, state that you cannot answer based on the provided information and use your general knowledge.
+
+Contexts:
+{contexts}
+
+Question: {question}"""
+
 def create_mock_project(directory: str):
     """Create a small mock project with 3 files."""
     os.makedirs(directory, exist_ok=True)
@@ -58,110 +101,241 @@ def get_user_by_id(user_id):
         with open(os.path.join(directory, name), "w") as f:
             f.write(content)
 
+def _iter_python_files(path: str):
+    """Yield paths of all Python files under path."""
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(".py") and entry.is_file():
+                        yield entry.path
+        except OSError as e:
+            print(f"⚠️ Error scanning {directory}: {e}")
+
+def _read_document(file_path: str, root: str):
+    """Read and clean a Python file, returning None if it is empty or unreadable."""
+    try:
+        content = Path(file_path).read_bytes().decode("utf-8", "replace")
+    except Exception as e:
+        print(f"⚠️ Error reading {os.path.basename(file_path)}: {e}")
+        return None
+
+    content = content.replace('\r\n', '\n').replace('\r', '\n')
+    content = content.translate(_CONTROL_CHARS)
+
+    if not content.strip():  # Only add non-empty files
+        return None
+
+    return {
+        "content": content,
+        "metadata": {
+            "filename": os.path.basename(file_path),
+            "filepath": os.path.relpath(file_path, root)
+        }
+    }
+
 def ingest_codebase(path: str):
     """Batch ingest Python files into Alchemyst context with error handling."""
     print(f"Ingesting files from {path}...")
 
-    documents = []
-
-    for root, _, files in os.walk(path):
-        for file in files:
-            if file.endswith(".py"):
-                file_path = os.path.join(root, file)
-
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-
-                    content = content.replace('\r\n', '\n').replace('\r', '\n')
-                    content = ''.join(char for char in content if ord(char) >= 32 or char in '\n\t')
-                    
-                    if content.strip():  # Only add non-empty files
-                        documents.append({
-                            "content": content,
-                            "metadata": {
-                                "filename": file,
-                                "filepath": os.path.relpath(file_path, path)
-                            }
-                        })
-                        
-                except Exception as e:
-                    print(f"⚠️ Error reading {file}: {e}")
-                    continue
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+        documents = [
+            doc for doc in executor.map(lambda fp: _read_document(fp, path), _iter_python_files(path))
+            if doc is not None
+        ]
 
     if not documents:
         print("⚠️ No Python files found to ingest")
         return
 
-    # Try ingesting files one by one to isolate problematic files
+    # Skip files whose path and content were already ingested for this key and source
+    scope = _ingest_scope(INGEST_SOURCE)
+    ingested = {} if INGEST_FORCE else _load_ingested_hashes(scope)
+    pending = []
+    hashes = []
+    for doc in documents:
+        content_hash = hashlib.sha256(doc["content"].encode("utf-8")).hexdigest()
+        if ingested.get(doc["metadata"]["filepath"]) != content_hash:
+            pending.append(doc)
+            hashes.append(content_hash)
+
+    skipped = len(documents) - len(pending)
+    if skipped:
+        print(f"↷ Skipping {skipped} unchanged file(s)")
+    if not pending:
+        print("✔ All files already ingested")
+        return
+
+    documents = pending
     successful_ingests = 0
-    
-    for i, doc in enumerate(documents):
+
+    batches = [
+        (documents[start:start + INGEST_BATCH_SIZE], start)
+        for start in range(0, len(documents), INGEST_BATCH_SIZE)
+    ]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(INGEST_WORKERS, len(batches)))) as executor:
+        futures = {executor.submit(_ingest_batch, batch, start): start for batch, start in batches}
+        for future in as_completed(futures):
+            start = futures[future]
+            for i in future.result():
+                ingested[documents[start + i]["metadata"]["filepath"]] = hashes[start + i]
+                successful_ingests += 1
+
+    _save_ingested_hashes(scope, ingested)
+    print(f"✔ Successfully ingested {successful_ingests}/{len(documents)} files")
+
+def _ingest_scope(source: str) -> str:
+    """Key ingest records by a hash of the API key and the context source."""
+    return hashlib.sha256(f"{ALCHEMYST_KEY}:{source}".encode("utf-8")).hexdigest()
+
+def _read_ingest_cache() -> dict:
+    """Load every scope recorded in the ingest sidecar."""
+    try:
+        with open(INGEST_CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"⚠️ Error loading ingest cache: {e}")
+        return {}
+
+def _load_ingested_hashes(scope: str) -> dict:
+    """Load the path -> content hash map recorded by previous ingests in this scope."""
+    return _read_ingest_cache().get(scope, {})
+
+def _save_ingested_hashes(scope: str, ingested: dict):
+    """Persist the content hashes of ingested files for this scope."""
+    cache = _read_ingest_cache()
+    cache[scope] = ingested
+    try:
+        os.makedirs(os.path.dirname(INGEST_CACHE_PATH), exist_ok=True)
+        with open(INGEST_CACHE_PATH, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+    except Exception as e:
+        print(f"⚠️ Error saving ingest cache: {e}")
+
+def _add_documents(**kwargs):
+    """Call context.add, waiting for a free slot so the server isn't flooded."""
+    with _ingest_slots:
+        return client.v1.context.add(**kwargs)
+
+def _ingest_batch(batch, offset: int) -> list:
+    """Ingest a batch of documents in one call, falling back to one-by-one on failure.
+
+    Returns the positions within the batch that were ingested successfully.
+    """
+    try:
+        print(f"Ingesting files {offset+1}-{offset+len(batch)}...")
+        _add_documents(
+            documents=batch,
+            source=INGEST_SOURCE,
+            context_type="resource",
+            scope="internal",
+            metadata={
+                "fileName": "project-codebase",
+                "fileType": "python",
+                "lastModified": datetime.datetime.now().isoformat(),
+                "fileSize": sum(len(doc["content"]) for doc in batch)
+            }
+        )
+        print(f"✔ Successfully ingested batch of {len(batch)} files")
+        return list(range(len(batch)))
+    except Exception as e:
+        print(f"❌ Batch ingest failed: {e}")
+        print("Retrying files one by one...")
+
+    # context.add reports no per-document result, so the documents the bulk call
+    # rejected can't be told apart; retry them all one by one. If the server had
+    # accepted part of the batch before failing, those documents are duplicated.
+    successful_ingests = []
+
+    for position, doc in enumerate(batch):
+        i = offset + position
+        filename = doc.get("metadata", {}).get("filename", f"file_{i}")
         try:
-            print(f"Ingesting file {i+1}/{len(documents)}...")
+            print(f"Ingesting file {i+1}...")
             
-            response = client.v1.context.add(
+            _add_documents(
                 documents=[doc],
-                source="project-codebase",
+                source=INGEST_SOURCE,
                 context_type="resource",
                 scope="internal",
                 metadata={
-                    "fileName": doc.get("metadata", {}).get("filename", f"file_{i}"),
+                    "fileName": filename,
                     "fileType": "python",
                     "lastModified": datetime.datetime.now().isoformat(),
                     "fileSize": len(doc["content"])
                 }
             )
-            successful_ingests += 1
-            print(f"✔ Successfully ingested {doc.get('metadata', {}).get('filename', f'file_{i}')}")
+            successful_ingests.append(position)
+            print(f"✔ Successfully ingested {filename}")
             
         except Exception as e:
-            print(f"❌ Error ingesting {doc.get('metadata', {}).get('filename', f'file_{i}')}: {e}")
+            print(f"❌ Error ingesting {filename}: {e}")
             
             # Try with minimal metadata as fallback
             try:
                 print("Retrying with minimal metadata...")
-                response = client.v1.context.add(
+                _add_documents(
                     documents=[{"content": doc["content"]}],
-                    source="project-codebase"
+                    source=INGEST_SOURCE
                 )
-                successful_ingests += 1
+                successful_ingests.append(position)
                 print(f"✔ Successfully ingested with fallback method")
             except Exception as e2:
                 print(f"❌ Fallback also failed: {e2}")
                 continue
     
-    print(f"✔ Successfully ingested {successful_ingests}/{len(documents)} files")
+    return successful_ingests
+
+def _embed_for_cache(query: str):
+    """Embed a query for the search cache, or None if embedding fails."""
+    try:
+        return embed_query(query)
+    except Exception as e:
+        print(f"⚠️ Query embedding error: {e}")
+        return None
+
+def search_contexts(question: str):
+    """Search Alchemyst context, reusing results cached for similar questions."""
+    query_embedding = _embed_for_cache(question)
+    if query_embedding is not None:
+        cached = search_cache.get(query_embedding)
+        if cached is not None:
+            return cached
+
+    results = client.v1.context.search(
+        query=question,
+        similarity_threshold=0.8, 
+        minimum_similarity_threshold = 0.5,
+        scope = "internal",
+        metadata= None,
+    )
+
+    docs = results.contexts or []
+    if query_embedding is not None:
+        search_cache.put(query_embedding, docs)
+    return docs
 
 def get_answer(question: str):
     """Search Alchemyst context and answer with Gemini."""
     try:
-        results = client.v1.context.search(
-            query=question,
-            similarity_threshold=0.8, 
-            minimum_similarity_threshold = 0.5,
-            scope = "internal",
-            metadata= None,
-        )
-
-        docs = results.contexts or []
+        docs = search_contexts(question)
 
         if len(docs) > 0:
             print(f"🔍 Found {len(docs)} relevant documents.")
-            contexts = []
-            for i, doc in enumerate(docs):
-                content = getattr(doc, "content", None) or str(doc)
-                contexts.append(f"Context {i+1}: {content}")
-            formatted_contexts = "\n\n".join(contexts)
+            formatted_contexts = "\n\n".join(
+                f"Context {i+1}: {getattr(doc, 'content', None) or doc}"
+                for i, doc in enumerate(docs)
+            )
 
             print("\n" + "─" * 50 + "\n")
-            prompt = f"""Based on the following context, please answer the question.
-            If the context is insufficient, state that you cannot answer based on the provided information and use your general knowledge.
-
-            Contexts:
-            {formatted_contexts}
-
-            Question: {question}"""
+            prompt = ANSWER_PROMPT_TEMPLATE.format(contexts=formatted_contexts, question=question)
         else:
             print("⚠️ No relevant context found, falling back to general knowledge.")
             prompt = question
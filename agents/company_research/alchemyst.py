@@ -1,20 +1,99 @@
 from alchemyst_ai import AlchemystAI
-from gemini import generate_research_report
-import requests
-import json
-import sseclient  
+from gemini import generate_research_report, REPORT_ERROR_PREFIX
+from report_cache import ReportCache
+from semantic_cache import SemanticCache, embed_query
+import asyncio
+from functools import lru_cache
+import httpx
+import orjson
 import os
+import threading
 import time
 from dotenv import load_dotenv
 
-load_dotenv()
+if not os.getenv("ALCHEMYST_API_KEY"):
+    load_dotenv()
 
 ALCHEMYST_API_KEY = os.getenv("ALCHEMYST_API_KEY")
 
-client = AlchemystAI(api_key=ALCHEMYST_API_KEY)
+@lru_cache(maxsize=1)
+def get_client():
+    """Create the Alchemyst SDK client on first use"""
+    return AlchemystAI(api_key=ALCHEMYST_API_KEY)
 
-def getPromptForCompanyResearch(companyName: str) -> str:
-    return f"""You are an expert business intelligence analyst. Research {companyName} and provide a comprehensive report.
+search_cache = SemanticCache(threshold=0.85, ttl=300, max_size=512)
+
+_report_cache = None
+_report_cache_opened = False
+_report_cache_lock = threading.Lock()
+
+def get_report_cache():
+    """Open the report cache once, on first use, or return None if it can't be opened"""
+    global _report_cache, _report_cache_opened
+    if not _report_cache_opened:
+        with _report_cache_lock:
+            if not _report_cache_opened:
+                try:
+                    _report_cache = ReportCache(
+                        path=os.getenv(
+                            "REPORT_CACHE_PATH",
+                            os.path.join(os.path.expanduser("~"), ".cache", "alchemyst", "reports.sqlite3")
+                        ),
+                        ttl=float(os.getenv("REPORT_CACHE_TTL", "86400"))
+                    )
+                except Exception as e:
+                    print(f"⚠️ Report cache disabled: {str(e)}")
+                _report_cache_opened = True
+    return _report_cache
+
+# Shared HTTP/2 client so concurrent deep research calls multiplex over pooled
+# keep-alive connections. Its connections belong to one event loop, which runs
+# in a background thread; both are created together, once, on first use.
+_http_loop = None
+_http_client = None
+_http_lock = threading.Lock()
+
+async def _create_http_client():
+    return httpx.AsyncClient(
+        # Per-operation limits; a stalled stream fails after `read` seconds of silence
+        timeout=httpx.Timeout(connect=10, read=60, write=10, pool=5),
+        headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {ALCHEMYST_API_KEY}'},
+        transport=httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=3,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+        )
+    )
+
+def get_http_loop():
+    """Start the background event loop and create the HTTP client on it, once"""
+    global _http_loop, _http_client
+    if _http_loop is None:
+        with _http_lock:
+            if _http_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, daemon=True).start()
+                _http_client = asyncio.run_coroutine_threadsafe(_create_http_client(), loop).result()
+                _http_loop = loop
+    return _http_loop
+
+def get_http_client():
+    """Return the shared HTTP client, starting its event loop if needed"""
+    get_http_loop()
+    return _http_client
+
+# Overall time budget for one deep research stream, in seconds
+RESEARCH_DEADLINE = float(os.getenv("RESEARCH_DEADLINE", "300"))
+
+# Echo streamed tokens to stdout; off by default since the callback carries them
+DEBUG_STREAM = os.getenv("ALCHEMYST_DEBUG", "").lower() in ("1", "true", "yes")
+
+# SSE framing constants, kept as bytes so payloads are only decoded when needed
+SSE_DATA_PREFIX = b'data:'
+SSE_DONE = b'[DONE]'
+STREAM_END = "[STREAM_END]"
+
+COMPANY_RESEARCH_PROMPT_TEMPLATE = """You are an expert business intelligence analyst. Research {company} and provide a comprehensive report.
 
 **RESEARCH STRUCTURE:**
 1. **EXECUTIVE SUMMARY** - Overview, key findings, market position
@@ -32,56 +111,138 @@ def getPromptForCompanyResearch(companyName: str) -> str:
 
 **DELIVERABLE:** Actionable intelligence for investors and decision-makers.
 
-Begin research on: {companyName}"""
+Begin research on: {company}"""
 
-def process_stream_response(response, callback):
-    """Process the streaming response with lower complexity"""
-    full_content = ""
-    send_status(callback, "Starting analysis...")
-    
-    for line in response.iter_lines():
+@lru_cache(maxsize=1024)
+def getPromptForCompanyResearch(companyName: str) -> str:
+    return COMPANY_RESEARCH_PROMPT_TEMPLATE.format(company=companyName)
+
+class SSEParser:
+    """Incremental SSE parser fed with raw byte chunks.
+
+    Only newly received bytes are scanned for line breaks. A data line that
+    is a complete JSON value or the done marker is returned straight away, so
+    streams that don't separate events with blank lines still work; other
+    data lines are joined until the event's terminating blank line arrives.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._data = []
+
+    def push(self, chunk):
+        """Feed a chunk of the body and return the data of completed events"""
+        scan_from = len(self._buffer)
+        self._buffer += chunk
+        events = []
+        start = 0
+        while True:
+            end = self._buffer.find(b"\n", scan_from)
+            if end < 0:
+                break
+            self._handle_line(bytes(self._buffer[start:end]).rstrip(b"\r"), events)
+            start = scan_from = end + 1
+        del self._buffer[:start]
+        return events
+
+    def close(self):
+        """Return the data of an event left unterminated at end of stream"""
+        events = []
+        if self._buffer:
+            self._handle_line(bytes(self._buffer).rstrip(b"\r"), events)
+            self._buffer.clear()
+        self._handle_line(b"", events)
+        return events
+
+    def _handle_line(self, line, events):
         if not line:
-            continue
-            
-        content = process_line(line, callback)
-        if content == "[STREAM_END]":
-            send_status(callback, "Analysis complete!")
+            if self._data:
+                events.append(b"\n".join(self._data))
+                self._data = []
+        elif line.startswith(SSE_DATA_PREFIX):
+            value = line[len(SSE_DATA_PREFIX):]
+            value = value[1:] if value.startswith(b" ") else value
+            if self._is_complete(value):
+                self._handle_line(b"", events)
+                events.append(value)
+            else:
+                self._data.append(value)
+
+    @staticmethod
+    def _is_complete(value):
+        stripped = value.strip()
+        if stripped == SSE_DONE:
+            return True
+        if stripped[:1] not in (b"{", b"[") or stripped[-1:] not in (b"}", b"]"):
+            return False
+        try:
+            orjson.loads(stripped)
+            return True
+        except orjson.JSONDecodeError:
+            return False
+
+async def iter_sse_data(response, deadline):
+    """Yield the data payload of each SSE event in the response.
+
+    Every read is bounded by the time left until `deadline` (a monotonic
+    timestamp), so keep-alive comments or trickled partial lines can't keep
+    the stream open; asyncio.TimeoutError is raised once it passes.
+    """
+    parser = SSEParser()
+    chunks = response.aiter_bytes()
+    while True:
+        try:
+            chunk = await asyncio.wait_for(chunks.__anext__(), deadline - time.monotonic())
+        except StopAsyncIteration:
             break
-        elif content:
-            full_content += content
+        for data in parser.push(chunk):
+            yield data
+    for data in parser.close():
+        yield data
+
+async def process_stream_response(response, callback):
+    """Yield content deltas from the streaming response"""
+    send_status(callback, "Starting analysis...")
+    deadline = time.monotonic() + RESEARCH_DEADLINE
     
-    return full_content
+    try:
+        async for data in iter_sse_data(response, deadline):
+            content = process_event(data, callback)
+            if content == STREAM_END:
+                send_status(callback, "Analysis complete!")
+                break
+            elif content:
+                yield content
+    except asyncio.TimeoutError:
+        send_error(callback, f"Research stream exceeded {RESEARCH_DEADLINE:.0f}s and was stopped")
 
-def process_line(line, callback):
-    """Process a single line from the stream"""
+def process_event(data, callback):
+    """Process the data payload of a single SSE event"""
     try:
-        line_text = line.decode('utf-8')
-        if not line_text.startswith('data:'):
-            return ""
-            
-        data_content = line_text[5:].strip()
+        data_content = data.strip()
         
-        if data_content == '[DONE]':
-            return "[STREAM_END]"
+        if data_content == SSE_DONE:
+            return STREAM_END
             
         return parse_data_content(data_content, callback)
         
     except Exception as e:
-        send_error(callback, f"Line processing error: {str(e)}")
+        send_error(callback, f"Event processing error: {str(e)}")
         return ""
 
 def parse_data_content(data_content, callback):
     """Parse the data content from SSE"""
     try:
-        parsed = json.loads(data_content)
+        parsed = orjson.loads(data_content)
         content = parsed.get('content', '')
         if content:
             send_content(callback, content)
             return content
-    except json.JSONDecodeError:
-        if data_content and data_content != '[DONE]':
-            send_content(callback, data_content)
-            return data_content + " "
+    except orjson.JSONDecodeError:
+        text = data_content.decode('utf-8', 'replace')
+        if text:
+            send_content(callback, text)
+            return text + " "
     return ""
 
 def send_status(callback, message):
@@ -90,10 +251,11 @@ def send_status(callback, message):
         callback("status", message)
 
 def send_content(callback, content):
-    """Send content via callback and print"""
+    """Send content via callback, printing it when debugging"""
     if callback:
-        callback("status", content)
-    print(content, end='', flush=True)
+        callback("token", content)
+    if DEBUG_STREAM:
+        print(content, end='', flush=True)
 
 def send_error(callback, error_msg):
     """Send error via callback"""
@@ -102,31 +264,51 @@ def send_error(callback, error_msg):
 
 def handle_error(e, callback):
     """Handle different types of errors"""
-    if isinstance(e, requests.exceptions.RequestException):
+    if isinstance(e, httpx.HTTPError):
         error_msg = f"Request failed: {str(e)}"
     else:
         error_msg = f"Unexpected error: {str(e)}"
     
     send_error(callback, error_msg)
 
-def perform_deep_research(companyName: str, callback=None):
+async def perform_deep_research(companyName: str, callback=None):
     url = 'https://platform-backend.getalchemystai.com/api/v1/chat/generate/stream'
-    headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {ALCHEMYST_API_KEY}'}
     data = {'chat_history': [{'content': getPromptForCompanyResearch(companyName=companyName), 'role': 'user'}], 'persona': 'maya'}
     
     try:
-        response = requests.post(url, headers=headers, json=data, stream=True, timeout=300)
-        response.raise_for_status()
-        return process_stream_response(response, callback)
+        async with get_http_client().stream("POST", url, json=data) as response:
+            response.raise_for_status()
+            async for content in process_stream_response(response, callback):
+                yield content
     except Exception as e:
         handle_error(e, callback)
-        return ""
 
-def add_content(fileName: str, fileType: str, content: str):
-    """Add content to Alchemyst context"""
+def perform_deep_research_sync(companyName: str, callback=None):
+    """Iterate perform_deep_research from synchronous code"""
+    stream = perform_deep_research(companyName, callback)
+    http_loop = get_http_loop()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(stream.__anext__(), http_loop).result()
+            except StopAsyncIteration:
+                break
+    finally:
+        asyncio.run_coroutine_threadsafe(stream.aclose(), http_loop).result()
+
+def add_content(fileName: str, fileType: str, content):
+    """Add content to Alchemyst context.
+
+    content is either a string or an iterable of page strings, which are sent
+    as one document per page so large files are never joined into one string.
+    """
     try:
-        docs_array = [{ "content": content }]
-        response = client.v1.context.add(
+        pages = [content] if isinstance(content, str) else content
+        docs_array = [{ "content": page } for page in pages if page]
+        if not docs_array:
+            print(f"⚠️ No text extracted from {fileName}")
+            return False
+        response = get_client().v1.context.add(
             documents=docs_array,
             source=fileName,
             context_type="resource",
@@ -135,28 +317,44 @@ def add_content(fileName: str, fileType: str, content: str):
                 "fileName": fileName,
                 "fileType": "resource",
                 "lastModified": str(time.time() * 1000),
-                "fileSize": len(content),
+                "fileSize": sum(len(doc["content"]) for doc in docs_array),
             }
         )
+        search_cache.clear()
         print(f"✅ Added context: {fileName}")
         return True
     except Exception as e:
         print(f"❌ Error adding context: {str(e)}")
         return False
 
+def _embed_for_cache(query: str):
+    """Embed a query for the search cache, or None if embedding fails"""
+    try:
+        return embed_query(query)
+    except Exception as e:
+        print(f"⚠️ Query embedding error: {str(e)}")
+        return None
+
 def search_context(user_query: str) -> str:
     """Search for relevant context in Alchemyst"""
     try:
-        results = client.v1.context.search(
+        query_embedding = _embed_for_cache(user_query)
+        if query_embedding is not None:
+            cached = search_cache.get(query_embedding)
+            if cached is not None:
+                return cached
+
+        results = get_client().v1.context.search(
             query=user_query,
             similarity_threshold=0.8,
             minimum_similarity_threshold=0.4,
             scope="internal",
             metadata=None
         )
-        if results.contexts:
-            return " ".join(x.content for x in results.contexts)
-        return ""
+        combined = " ".join(x.content for x in results.contexts) if results.contexts else ""
+        if query_embedding is not None:
+            search_cache.put(query_embedding, combined)
+        return combined
     except Exception as e:
         print(f"❌ Context search error: {str(e)}")
         return ""
@@ -164,25 +362,55 @@ def search_context(user_query: str) -> str:
 def initiate_company_research(query: str, callback=None):
     """
     Main research function that uses Gemini with context when available,
-    falls back to Alchemyst deep research when no context
+    falls back to Alchemyst deep research when no context.
+    Yields the report as it is generated.
     """
     try:
         combined_context = search_context(query)
+        report_cache = get_report_cache()
         
+        cached_report = report_cache.get(query, combined_context) if report_cache else None
+        if cached_report is not None:
+            if callback:
+                callback("content", cached_report)
+                callback("status", "♻️ Loaded cached analysis")
+            yield cached_report
+            return
+
         if combined_context.strip():            
             report = generate_research_report(query, combined_context)
             
             if callback:
                 callback("content", report)
                 callback("status", "✅ Context-enhanced analysis complete!")
-            return report
+            if report_cache and not report.startswith(REPORT_ERROR_PREFIX):
+                report_cache.put(query, combined_context, report)
+            yield report
         else:
             if callback:
                 callback("status", "🌐 Performing deep web research...")
-            return perform_deep_research(query, callback)
+
+            failed = False
+
+            def tracking_callback(message_type, content):
+                nonlocal failed
+                if message_type == "error":
+                    failed = True
+                if callback:
+                    callback(message_type, content)
+
+            parts = []
+            for content in perform_deep_research_sync(query, tracking_callback):
+                parts.append(content)
+                yield content
+            if report_cache and parts and not failed:
+                report_cache.put(query, combined_context, "".join(parts))
             
     except Exception as e:
         error_msg = f"Research error: {str(e)}"
         if callback:
             callback("error", error_msg)
-        return ""
\ No newline at end of file
+
+def initiate_company_research_collect(query: str, callback=None):
+    """Run initiate_company_research and return the full report"""
+    return "".join(initiate_company_research(query, callback))
\ No newline at end of file
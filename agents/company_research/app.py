@@ -1,7 +1,12 @@
 import streamlit as st
-from alchemyst import initiate_company_research, add_content
-import time
+from alchemyst import initiate_company_research_collect, add_content
+import hashlib
+import html
 import os
+import queue
+import threading
+import time
+from collections import deque
 from io import StringIO
 
 # Page configuration
@@ -13,63 +18,42 @@ st.set_page_config(
 )
 
 # Custom CSS for streaming updates
-st.markdown("""
-<style>
-    .streaming-update {
-        padding: 12px;
-        margin: 8px 0;
-        border-radius: 8px;
-        border-left: 4px solid #3B82F6;
-        background: #1F2937;
-        color: #F3F4F6;
-        font-family: 'Courier New', monospace;
-        animation: fadeIn 0.5s ease-in;
-    }
-    .error-update {
-        padding: 12px;
-        margin: 8px 0;
-        border-radius: 8px;
-        border-left: 4px solid #EF4444;
-        background: #7F1D1D;
-        color: #FECACA;
-        font-family: 'Courier New', monospace;
-    }
-    .final-report {
-        background: #1F2937;
-        padding: 2rem;
-        border-radius: 12px;
-        border: 1px solid #374151;
-        margin-top: 1rem;
-        color: #F3F4F6;
-        line-height: 1.6;
-    }
-    .status-container {
-        max-height: 200px;
-        overflow-y: auto;
-        margin-bottom: 1rem;
-    }
-    .sidebar-content {
-        padding: 1rem;
-    }
-    .uploaded-file {
-        background: #1F2937;
-        padding: 0.5rem;
-        margin: 0.5rem 0;
-        border-radius: 8px;
-        border-left: 4px solid #10B981;
-    }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_resource
+def load_css():
+    """Read the app stylesheet once per server process"""
+    with open(os.path.join(os.path.dirname(__file__), "styles.css"), encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+# Streamlit drops elements that aren't re-emitted, so inject on every run
+st.markdown(load_css(), unsafe_allow_html=True)
+
+# Minimum seconds between UI redraws while a report is streaming
+MIN_RENDER_INTERVAL = 0.2
+# Number of most recent status messages shown
+STATUS_HISTORY = 5
+# Streamed report characters to accumulate before the report is redrawn
+REPORT_RENDER_DELTA = 256
 
 class StreamlitResearchApp:
     def __init__(self):
-        self.status_messages = []
-        self.current_report = ""
+        self.status_messages = deque(maxlen=STATUS_HISTORY)
+        self._status_html_parts = deque(maxlen=STATUS_HISTORY)  # Pre-rendered HTML for each status message
+        self._dirty = False  # Whether status or the whole report changed since the last redraw
+        self._report_parts = []
+        self._report_text = ""  # Joined report, valid while _report_parts is unchanged
+        self._report_len = 0
+        self._rendered_report_len = 0
         self.has_error = False  # Add error flag
         
         # Initialize session state for uploaded files
         if 'uploaded_files' not in st.session_state:
             st.session_state.uploaded_files = []
+        if 'uploaded_names' not in st.session_state:
+            st.session_state.uploaded_names = set()
+        if 'attempted_uploads' not in st.session_state:
+            st.session_state.attempted_uploads = set()
+        if 'uploaded_hashes' not in st.session_state:
+            st.session_state.uploaded_hashes = set()
     
     def render_sidebar(self):
         """Render the sidebar for file uploads"""
@@ -107,22 +91,40 @@ class StreamlitResearchApp:
             return
         
         for uploaded_file in uploaded_files:
-            if uploaded_file.name in [f['name'] for f in st.session_state.uploaded_files]:
+            # Each upload is tried once; re-uploading a file gives it a new file_id
+            if uploaded_file.file_id in st.session_state.attempted_uploads:
+                continue
+            st.session_state.attempted_uploads.add(uploaded_file.file_id)
+
+            if uploaded_file.name in st.session_state.uploaded_names:
+                continue
+
+            # Skip files whose content was already uploaded under another name
+            content_hash = hashlib.blake2b(uploaded_file.getvalue()).hexdigest()
+            if content_hash in st.session_state.uploaded_hashes:
                 continue
                 
+            # Extracted text goes straight to Alchemyst; only file details are kept
             file_content = self._process_uploaded_file(uploaded_file)
-            if file_content:
+            if file_content is None:
+                continue
+
+            # Only remember files Alchemyst accepted, so a re-upload can retry the rest
+            if add_content(
+                fileName=uploaded_file.name,
+                fileType=uploaded_file.type, 
+                content=file_content
+            ):
+                st.session_state.uploaded_names.add(uploaded_file.name)
+                st.session_state.uploaded_hashes.add(content_hash)
                 st.session_state.uploaded_files.append({
                     'name': uploaded_file.name,
                     'type': uploaded_file.type,
                     'size': uploaded_file.size,
-                    'content': file_content
+                    'hash': content_hash
                 })
-                add_content(
-                    fileName=uploaded_file.name,
-                    fileType=uploaded_file.type, 
-                    content=file_content
-                )
+            else:
+                st.warning(f"Could not add {uploaded_file.name} to the research context. Re-upload it to try again.")
 
     def _render_files_section(self):
         """Render uploaded files section"""
@@ -140,7 +142,10 @@ class StreamlitResearchApp:
             """, unsafe_allow_html=True)
     
     def _process_uploaded_file(self, uploaded_file):
-        """Process uploaded file and extract text content"""
+        """Process uploaded file and extract text content.
+
+        Returns a string for text files and an iterator of page texts for PDFs.
+        """
         try:
             # For text files
             if uploaded_file.type == "text/plain":
@@ -150,14 +155,10 @@ class StreamlitResearchApp:
             # For PDF files
             elif uploaded_file.type == "application/pdf":
                 try:
-                    import PyPDF2
-                    pdf_reader = PyPDF2.PdfReader(uploaded_file)
-                    text = ""
-                    for page in pdf_reader.pages:
-                        text += page.extract_text()
-                    return text
+                    import pypdfium2 as pdfium
+                    return self._iter_pdf_pages(pdfium.PdfDocument(uploaded_file.getvalue()))
                 except ImportError:
-                    st.error("PDF processing requires PyPDF2. Install with: pip install PyPDF2")
+                    st.error("PDF processing requires pypdfium2. Install with: pip install pypdfium2")
                     return None
             else:
                 st.warning(f"Unsupported file type: {uploaded_file.type}")
@@ -167,16 +168,52 @@ class StreamlitResearchApp:
             st.error(f"Error processing file {uploaded_file.name}: {str(e)}")
             return None
     
+    @staticmethod
+    def _iter_pdf_pages(pdf):
+        """Yield the text of each PDF page, closing the document when done"""
+        try:
+            for page in pdf:
+                textpage = page.get_textpage()
+                yield textpage.get_text_range()
+                textpage.close()
+                page.close()
+        finally:
+            pdf.close()
+
     def update_callback(self, message_type, content):
         """Callback function to handle real-time updates from the streaming client"""
+        if not isinstance(content, str):
+            content = str(content)
         if message_type == "status":
-            self.status_messages.append(f"🔄 {content}")
+            self._add_status_message(f"🔄 {content}")
+        elif message_type == "token":
+            # Streamed report tokens
+            self._report_parts.append(content)
+            self._report_text = None
+            self._report_len += len(content)
         elif message_type == "content":
             # Replace the entire report with new content (complete report)
-            self.current_report = content
+            self._report_parts = [content]
+            self._report_text = content
+            self._report_len = len(content)
+            self._dirty = True
         elif message_type == "error":
-            self.status_messages.append(f"❌ {content}")
+            self._add_status_message(f"❌ {content}")
             self.has_error = True  # Set error flag
+
+    @property
+    def current_report(self):
+        """Report text received so far"""
+        if self._report_text is None:
+            self._report_text = "".join(self._report_parts)
+        return self._report_text
+
+    def _add_status_message(self, msg):
+        """Record a status message along with its rendered HTML"""
+        self.status_messages.append(msg)
+        css_class = "error-update" if "❌" in msg else "streaming-update"
+        self._status_html_parts.append(f'<div class="{css_class}">{html.escape(msg)}</div>')
+        self._dirty = True
     
     def render_header(self):
         """Render the main header"""
@@ -214,91 +251,102 @@ class StreamlitResearchApp:
     def render_streaming_section(self, company_name):
         """Render the streaming analysis section"""
         self._reset_analysis_state()
-        status_placeholder, report_placeholder = self._create_placeholders()
+        output_placeholder = self._create_placeholder()
         
-        final_report = self._run_analysis_with_updates(company_name, status_placeholder, report_placeholder)
-        return self._handle_final_result(final_report, status_placeholder, report_placeholder)
+        final_report = self._run_analysis_with_updates(company_name, output_placeholder)
+        return self._handle_final_result(final_report, output_placeholder)
 
     def _reset_analysis_state(self):
         """Reset state for new analysis"""
-        self.status_messages = []
-        self.current_report = ""
+        self.status_messages.clear()
+        self._status_html_parts.clear()
+        self._dirty = False
+        self._report_parts = []
+        self._report_text = ""
+        self._report_len = 0
+        self._rendered_report_len = 0
         self.has_error = False  # Reset error flag
 
-    def _create_placeholders(self):
-        """Create UI placeholders"""
-        status_placeholder = st.empty()
-        report_placeholder = st.empty()
-        return status_placeholder, report_placeholder
+    def _create_placeholder(self):
+        """Create the UI placeholder holding both status and report"""
+        return st.empty()
 
-    def _run_analysis_with_updates(self, company_name, status_placeholder, report_placeholder):
+    def _run_analysis_with_updates(self, company_name, output_placeholder):
         """Run analysis with real-time UI updates"""
         with st.spinner(f'Starting analysis for {company_name}...'):
-            # Get uploaded files content
-            uploaded_content = ""
-            if st.session_state.uploaded_files:
-                uploaded_content = "\n".join([file['content'] for file in st.session_state.uploaded_files])
-            
-            # Call initiate_company_research with uploaded content
-            final_report = initiate_company_research(
-                query=company_name,
-                callback=self.update_callback
-            )
-            
-            self._update_ui_while_processing(status_placeholder, report_placeholder, final_report)
-            return final_report
+            # Run the research in the background; its callback events are
+            # queued and applied to the UI from this thread as they arrive
+            events = queue.Queue()
+            result = {}
 
-    def _update_ui_while_processing(self, status_placeholder, report_placeholder, final_report):
-        """Update UI in real-time while processing"""
-        start_time = time.time()
-        max_wait_time = 60  # Reduced timeout since we're not streaming
-        
-        while time.time() - start_time < max_wait_time:
-            self._update_status_messages(status_placeholder)
-            self._update_report_content(report_placeholder)
-            
-            # Check stopping conditions:
-            # 1. We have a final report from the function return
-            # 2. There's an error flagged in callback
-            # 3. We have content from callback (report is complete)
-            if (final_report and final_report != "") or self.has_error or self.current_report:
-                break
-                
-            time.sleep(0.5)
-        
-        # One final update to show everything
-        self._update_status_messages(status_placeholder)
-        self._update_report_content(report_placeholder)
+            def run_research():
+                try:
+                    result["report"] = initiate_company_research_collect(
+                        query=company_name,
+                        callback=lambda message_type, content: events.put((message_type, content))
+                    )
+                finally:
+                    events.put(None)  # Signal that research has finished
 
-    def _update_status_messages(self, status_placeholder):
-        """Update status messages in UI"""
-        if self.status_messages:
-            status_html = self._format_status_messages()
-            status_placeholder.markdown(f'<div class="status-container">{status_html}</div>', unsafe_allow_html=True)
+            worker = threading.Thread(target=run_research, daemon=True)
+            worker.start()
+            self._update_ui_while_processing(events, output_placeholder)
+            worker.join()
+            return result.get("report", "")
 
-    def _update_report_content(self, report_placeholder):
-        """Update report content in UI"""
-        if self.current_report:
-            report_placeholder.markdown(f'<div class="final-report">{self.current_report}</div>', unsafe_allow_html=True)
+    def _update_ui_while_processing(self, events, output_placeholder):
+        """Update UI in real-time as callback events arrive"""
+        finished = False
+        last_render = 0.0
+        while not finished:
+            # Apply every event already queued so they share one redraw
+            try:
+                batch = [events.get(timeout=MIN_RENDER_INTERVAL)]
+            except queue.Empty:
+                batch = []
+            while not events.empty():
+                batch.append(events.get_nowait())
+            for event in batch:
+                if event is None:
+                    finished = True
+                    break
+                self.update_callback(*event)
 
-    def _format_status_messages(self):
-        """Format status messages with appropriate styling"""
-        status_html = ""
-        for msg in self.status_messages:
-            if "❌" in msg:
-                status_html += f'<div class="error-update">{msg}</div>'
-            else:
-                status_html += f'<div class="streaming-update">{msg}</div>'
-        return status_html
+            now = time.monotonic()
+            if finished or now - last_render >= MIN_RENDER_INTERVAL:
+                self._render_output(output_placeholder, final=finished)
+                last_render = now
+
+    def _render_output(self, output_placeholder, final=False):
+        """Redraw status messages and report in a single UI update.
+
+        Streamed report text only triggers a redraw once REPORT_RENDER_DELTA
+        characters have arrived, or when the stream is final.
+        """
+        report_delta = self._report_len - self._rendered_report_len
+        if not (self._dirty or report_delta >= REPORT_RENDER_DELTA or (final and report_delta)):
+            return
+        self._dirty = False
+        self._rendered_report_len = self._report_len
+
+        output = ""
+        if self._status_html_parts:
+            output += f'<div class="status-container">{"".join(self._status_html_parts)}</div>'
+        if self._report_parts:
+            output += f'<div class="final-report">{self.current_report}</div>'
+        output_placeholder.markdown(output, unsafe_allow_html=True)
 
-    def _handle_final_result(self, final_report, status_placeholder, report_placeholder):
+    def _handle_final_result(self, final_report, output_placeholder):
         """Handle the final result display"""
         # Use the final_report returned by the function, or fall back to current_report
         result_report = final_report if final_report else self.current_report
         
         if result_report and result_report.strip():
-            status_placeholder.markdown('<div class="streaming-update">✅ Analysis Complete</div>', unsafe_allow_html=True)
-            report_placeholder.markdown(f'<div class="final-report">{result_report}</div>', unsafe_allow_html=True)
+            output_placeholder.markdown(
+                '<div class="streaming-update">✅ Analysis Complete</div>'
+                f'<div class="final-report">{result_report}</div>',
+                unsafe_allow_html=True
+            )
             return result_report
         else:
             # If no report was generated, show appropriate error
@@ -1,20 +1,16 @@
 import os
-from alchemyst_ai import AlchemystAI
+from functools import lru_cache
 from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
 
-load_dotenv()
+if not os.getenv("GEMINI_API_KEY"):
+    load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-llm = ChatGoogleGenerativeAI(
-    model = "gemini-2.0-flash",
-    google_api_key = GEMINI_API_KEY,
-    temperature = 0.7
-)
+REPORT_ERROR_PREFIX = "Error generating report"
 
-def get_prompt(query: str, context: str):
-    return f"""
+RESEARCH_REPORT_PROMPT_TEMPLATE = """
         Extract company name from: "{query}"
 
         Using ONLY this context:{context}
@@ -33,12 +29,24 @@ def get_prompt(query: str, context: str):
         Constraints: Strictly use only provided context. No external knowledge.
     """
 
+@lru_cache(maxsize=4)
+def get_llm(temperature: float = 0.7):
+    """Create the Gemini chat model on first use"""
+    return ChatGoogleGenerativeAI(
+        model = "gemini-2.0-flash",
+        google_api_key = GEMINI_API_KEY,
+        temperature = temperature
+    )
+
+def get_prompt(query: str, context: str):
+    return RESEARCH_REPORT_PROMPT_TEMPLATE.format(query=query, context=context)
+
 def generate_research_report(company_query: str, context: str = ""):
     """Generate research report using Gemini LLM"""
     prompt = get_prompt(company_query, context)
     
     try:
-        response = llm.invoke(prompt)
+        response = get_llm().invoke(prompt)
         return response.content
     except Exception as e:
-        return f"Error generating report: {str(e)}"
\ No newline at end of file
+        return f"{REPORT_ERROR_PREFIX}: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from semantic_cache import SemanticCache, embed_query
+
+
+def normalize_company_name(name: str) -> str:
+    """Lowercase a company name and collapse its whitespace"""
+    return " ".join(name.lower().split())
+
+
+class ReportCache:
+    """Cache of finished research reports keyed on company name and context.
+
+    Exact hits on the normalized name are served from a SQLite file with a
+    TTL, so they survive app restarts. Near-duplicate names ("Tesla Inc" vs
+    "Tesla") are matched through an in-memory semantic layer over the name
+    embeddings. Reports are only reused when they were built from the same
+    uploaded context.
+    """
+
+    def __init__(self, path: str, ttl: float = 86400, threshold: float = 0.85):
+        self.path = path
+        self.ttl = ttl
+        self._semantic = SemanticCache(threshold=threshold, ttl=ttl, max_size=256)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._lock, closing(sqlite3.connect(self.path)) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS reports ("
+                "name TEXT, context_hash TEXT, report TEXT, created_at REAL, "
+                "PRIMARY KEY (name, context_hash))"
+            )
+            conn.commit()
+
+    def get(self, company: str, context: str = ""):
+        """Return a cached report for the company, or None on a miss"""
+        name = normalize_company_name(company)
+        context_hash = self._hash(context)
+
+        with self._lock, closing(sqlite3.connect(self.path)) as conn:
+            row = conn.execute(
+                "SELECT report, created_at FROM reports WHERE name = ? AND context_hash = ?",
+                (name, context_hash)
+            ).fetchone()
+        if row and time.time() - row[1] <= self.ttl:
+            return row[0]
+
+        embedding = self._embed(name)
+        if embedding is not None:
+            cached = self._semantic.get(embedding)
+            if cached is not None and cached[0] == context_hash:
+                return cached[1]
+        return None
+
+    def put(self, company: str, context: str, report: str):
+        """Store a finished report"""
+        name = normalize_company_name(company)
+        context_hash = self._hash(context)
+
+        with self._lock, closing(sqlite3.connect(self.path)) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?)",
+                (name, context_hash, report, time.time())
+            )
+            conn.execute("DELETE FROM reports WHERE created_at < ?", (time.time() - self.ttl,))
+            conn.commit()
+
+        embedding = self._embed(name)
+        if embedding is not None:
+            self._semantic.put(embedding, (context_hash, report))
+
+    @staticmethod
+    def _hash(context: str) -> str:
+        return hashlib.sha256(context.encode("utf-8")).hexdigest() if context else ""
+
+    @staticmethod
+    def _embed(name: str):
+        try:
+            return embed_query(name)
+        except Exception as e:
+            print(f"⚠️ Company name embedding error: {str(e)}")
+            return None